@@ -2,23 +2,44 @@
 """CLI tool to query the Pangram history database."""
 
 import argparse
-import json
+import atexit
+import functools
 import sqlite3
+import sys
+
+import orjson
+
+from schema import configure_connection, init_schema, load_json
 
 DATABASE = "pangram_history.db"
 
+SQL_LIST = """
+    SELECT id, created_at, word_count, CAST(credits AS INTEGER) as credits,
+           prediction_short,
+           replace(substr(text, 1, 60), char(10), ' ')
+               || CASE WHEN length(text) >= 60 THEN '...' ELSE '' END as preview
+    FROM analyses
+    ORDER BY created_at DESC
+    LIMIT ?
+"""
+
 
+@functools.lru_cache(maxsize=1)
 def get_db():
+    """Open the database once and share the connection for the whole process."""
     conn = sqlite3.connect(DATABASE)
+    atexit.register(close_db, conn)
     conn.row_factory = sqlite3.Row
+    configure_connection(conn)
+    # The CLI may run before the web app has migrated an existing database
+    init_schema(conn)
     return conn
 
 
-def calculate_credits(word_count: int) -> int:
-    """Calculate credits (1 credit per 1000 words, minimum 1, rounded up)."""
-    if word_count == 0:
-        return 0
-    return max(1, (word_count + 999) // 1000)
+def close_db(conn):
+    """Refresh planner statistics if needed, then close the connection."""
+    conn.execute("PRAGMA optimize")
+    conn.close()
 
 
 def cmd_stats(args):
@@ -28,14 +49,12 @@ def cmd_stats(args):
         SELECT 
             COUNT(*) as total_analyses,
             COALESCE(SUM(word_count), 0) as total_words,
+            CAST(COALESCE(SUM(credits), 0) AS INTEGER) as total_credits,
             MIN(created_at) as first_analysis,
             MAX(created_at) as last_analysis
         FROM analyses
     """).fetchone()
-
-    # Calculate credits from word counts
-    rows = db.execute("SELECT word_count FROM analyses").fetchall()
-    total_credits = sum(calculate_credits(r["word_count"]) for r in rows)
+    total_credits = row["total_credits"]
 
     print("=== Pangram Usage Stats ===")
     print(f"Total analyses:  {row['total_analyses']}")
@@ -48,43 +67,36 @@ def cmd_stats(args):
 
 def cmd_list(args):
     """List recent analyses."""
-    db = get_db()
-    rows = db.execute(
-        """
-        SELECT id, created_at, word_count, credits, prediction_short,
-               fraction_ai, substr(text, 1, 60) as preview
-        FROM analyses
-        ORDER BY created_at DESC
-        LIMIT ?
-    """,
-        (args.limit,),
-    ).fetchall()
-
-    if not rows:
-        print("No analyses found.")
-        return
-
-    print(
-        f"{'ID':<5} {'Date':<20} {'Words':<7} {'Credits':<8} {'Result':<12} {'Preview'}"
-    )
-    print("-" * 100)
-    for row in rows:
-        date = row["created_at"][:19].replace("T", " ")
-        preview = row["preview"].replace("\n", " ")
-        if len(row["preview"]) >= 60:
-            preview += "..."
-        credits = calculate_credits(row["word_count"])
+    cursor = get_db().cursor()
+    cursor.row_factory = None
+    cursor.execute(SQL_LIST, (args.limit,))
+
+    found = False
+    for id_, created_at, word_count, credits, prediction_short, preview in cursor:
+        if not found:
+            print(
+                f"{'ID':<5} {'Date':<20} {'Words':<7} {'Credits':<8} {'Result':<12} {'Preview'}"
+            )
+            print("-" * 100)
+            found = True
+        date = created_at[:19].replace("T", " ")
         print(
-            f"{row['id']:<5} {date:<20} {row['word_count']:<7} {credits:<8} {row['prediction_short']:<12} {preview}"
+            f"{id_:<5} {date:<20} {word_count:<7} {credits:<8} {prediction_short:<12} {preview}"
         )
 
+    if not found:
+        print("No analyses found.")
+
 
 def cmd_show(args):
     """Show full details of an analysis."""
     db = get_db()
     row = db.execute(
         """
-        SELECT * FROM analyses WHERE id = ?
+        SELECT id, created_at, word_count, CAST(credits AS INTEGER) as credits,
+               headline, prediction_short,
+               fraction_ai, fraction_ai_assisted, fraction_human, text
+        FROM analyses WHERE id = ?
     """,
         (args.id,),
     ).fetchone()
@@ -96,7 +108,7 @@ def cmd_show(args):
     print(f"=== Analysis #{row['id']} ===")
     print(f"Date:        {row['created_at']}")
     print(f"Words:       {row['word_count']}")
-    print(f"Credits:     {calculate_credits(row['word_count'])}")
+    print(f"Credits:     {row['credits']}")
     print(f"Headline:    {row['headline']}")
     print(f"Prediction:  {row['prediction_short']}")
     print(f"AI:          {row['fraction_ai'] * 100:.1f}%")
@@ -109,64 +121,92 @@ def cmd_show(args):
     if args.json:
         print()
         print("=== Response JSON ===")
-        print(json.dumps(json.loads(row["response_json"]), indent=2))
+        # Only load the (large) stored response when it is actually shown
+        response = db.execute(
+            "SELECT response_json, response_zstd FROM analyses WHERE id = ?",
+            (args.id,),
+        ).fetchone()
+        response_json = load_json(*response).decode()
+        print(
+            orjson.dumps(
+                orjson.loads(response_json), option=orjson.OPT_INDENT_2
+            ).decode()
+        )
 
 
-def cmd_export(args):
-    """Export analyses to JSON."""
-    db = get_db()
-    rows = db.execute("""
-        SELECT id, created_at, text, word_count, credits,
-               request_json, response_json
+def write_export(db, f) -> int:
+    """Stream all analyses to f as a JSON array, returning the row count."""
+    cursor = db.execute("""
+        SELECT id, created_at, text, word_count, CAST(credits AS INTEGER) as credits,
+               request_json, response_json, request_zstd, response_zstd
         FROM analyses
         ORDER BY created_at DESC
-    """).fetchall()
-
-    data = []
-    for row in rows:
-        data.append(
-            {
-                "id": row["id"],
-                "created_at": row["created_at"],
-                "text": row["text"],
-                "word_count": row["word_count"],
-                "credits": row["credits"],
-                "request": json.loads(row["request_json"]),
-                "response": json.loads(row["response_json"]),
-            }
+    """)
+
+    # The stored request/response JSON is spliced in verbatim, one row at a time
+    count = 0
+    f.write("[")
+    for row in cursor:
+        if count:
+            f.write(",")
+        request_json = load_json(row["request_json"], row["request_zstd"]).decode()
+        response_json = load_json(row["response_json"], row["response_zstd"]).decode()
+        f.write(
+            f'\n  {{"id": {row["id"]}, "created_at": {orjson.dumps(row["created_at"]).decode()}, '
+            f'"text": {orjson.dumps(row["text"]).decode()}, "word_count": {row["word_count"]}, '
+            f'"credits": {row["credits"]}, "request": {request_json}, '
+            f'"response": {response_json}}}'
         )
+        count += 1
+    f.write("\n]\n")
+    return count
+
 
-    output = json.dumps(data, indent=2)
+def cmd_export(args):
+    """Export analyses to JSON."""
+    db = get_db()
     if args.output:
-        with open(args.output, "w") as f:
-            f.write(output)
-        print(f"Exported {len(data)} analyses to {args.output}")
+        with open(args.output, "w", encoding="utf-8") as f:
+            count = write_export(db, f)
+        print(f"Exported {count} analyses to {args.output}")
     else:
-        print(output)
+        write_export(db, sys.stdout)
 
 
 def cmd_search(args):
     """Search analyses by text content."""
     db = get_db()
-    rows = db.execute(
-        """
-        SELECT id, created_at, word_count, prediction_short,
-               substr(text, 1, 80) as preview
-        FROM analyses
-        WHERE text LIKE ?
-        ORDER BY created_at DESC
+    query = args.query
+    prefix = query[:-1]
+    if prefix and query.endswith("%") and "%" not in prefix and "_" not in prefix:
+        # Trailing % asks for a prefix match; trigram indexes serve LIKE too
+        # (given 3+ characters). Any other % or _ is searched for literally.
+        where, param = "f.text LIKE ?", query
+    elif len(query) >= 3:
+        # Quote the query so FTS5 treats it as a literal substring
+        where, param = "analyses_fts MATCH ?", '"' + query.replace('"', '""') + '"'
+    else:
+        # Trigrams need at least 3 characters, so this scans the text
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where, param = "f.text LIKE ? ESCAPE '\\'", f"%{escaped}%"
+
+    # CROSS JOIN pins the FTS table as the outer loop, so the index lookup runs
+    # once; after ANALYZE the planner would otherwise probe it per analyses row
+    cursor = db.execute(
+        f"""
+        SELECT a.id, a.created_at, a.word_count, a.prediction_short,
+               substr(a.text, 1, 80) as preview
+        FROM analyses_fts f
+        CROSS JOIN analyses a ON a.id = f.rowid
+        WHERE {where}
+        ORDER BY a.created_at DESC
         LIMIT ?
     """,
-        (f"%{args.query}%", args.limit),
-    ).fetchall()
-
-    if not rows:
-        print(f"No analyses matching '{args.query}'")
-        return
+        (param, args.limit),
+    )
 
-    print(f"Found {len(rows)} matching analyses:")
-    print()
-    for row in rows:
+    count = 0
+    for row in cursor:
         date = row["created_at"][:19].replace("T", " ")
         preview = row["preview"].replace("\n", " ")
         print(
@@ -174,6 +214,12 @@ def cmd_search(args):
         )
         print(f"  {preview}...")
         print()
+        count += 1
+
+    if count:
+        print(f"Found {count} matching analyses.")
+    else:
+        print(f"No analyses matching '{args.query}'")
 
 
 def cmd_delete(args):
@@ -1,12 +1,19 @@
+import atexit
 import os
+import queue
 import sqlite3
-import json
+import threading
 import logging
+import re
+import time
 import traceback
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, g
+from compression import zstd
+import orjson
+from flask import Flask, render_template, request, g
 from pangram import Pangram
 
+from schema import configure_connection, init_schema, load_json
+
 app = Flask(__name__)
 
 DATABASE = "pangram_history.db"
@@ -17,47 +24,154 @@ if not PANGRAM_API_KEY:
 
 pangram = Pangram(api_key=PANGRAM_API_KEY)
 
+# str.split() is faster for typical inputs, but builds a list of every word
+WORD_RE = re.compile(r"\S+")
+LARGE_TEXT_CHARS = 1_000_000
+
+# Serialized /stats and /history bodies, cleared whenever /analyze saves a row.
+# The version is bumped on each save so a response built from a read that raced
+# the save is never stored. The TTL bounds staleness from writes made outside
+# the app (e.g. cli.py delete).
+CACHE_TTL = 60
+response_cache = {}
+cache_version = 0
+cache_lock = threading.Lock()
+
+# Open connections reused across requests instead of reconnecting every time
+DB_POOL_SIZE = 8
+db_pool = queue.Queue(maxsize=DB_POOL_SIZE)
+
+# Hot queries, kept as constants so pooled connections reuse their prepared
+# statements (sqlite3 caches them per connection, keyed by SQL text)
+SQL_INSERT_ANALYSIS = """
+    INSERT INTO analyses 
+    (created_at, text, word_count, credits, request_json, response_json,
+     request_zstd, response_zstd,
+     headline, prediction_short, fraction_ai, fraction_ai_assisted, fraction_human)
+    VALUES (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'),
+            ?, ?, ?, '', '', ?, ?, ?, ?, ?, ?, ?)
+    RETURNING id
+"""
+
+SQL_HISTORY = """
+    SELECT id, created_at, word_count, CAST(credits AS INTEGER) as credits,
+           headline, prediction_short,
+           fraction_ai, fraction_ai_assisted, fraction_human,
+           replace(substr(text, 1, 100), char(10), ' ')
+               || CASE WHEN length(text) >= 100 THEN '...' ELSE '' END as text_preview
+    FROM analyses
+    ORDER BY created_at DESC
+    LIMIT 100
+"""
+
+SQL_GET_ANALYSIS = """
+    SELECT id, created_at, text, word_count,
+           CAST(credits AS INTEGER) as credits, response_json, response_zstd
+    FROM analyses WHERE id = ?
+"""
+
+SQL_STATS = """
+    SELECT 
+        COUNT(*) as total_analyses,
+        COALESCE(SUM(word_count), 0) as total_words,
+        CAST(COALESCE(SUM(credits), 0) AS INTEGER) as total_credits
+    FROM analyses
+"""
+
+
+def open_db():
+    """Open a pooled database connection with the app's pragmas applied."""
+    conn = sqlite3.connect(DATABASE, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    configure_connection(conn)
+    return conn
+
 
 def get_db():
     """Get database connection for current request."""
     if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        try:
+            g.db = db_pool.get_nowait()
+        except queue.Empty:
+            g.db = open_db()
     return g.db
 
 
 @app.teardown_appcontext
 def close_db(exception):
-    """Close database connection at end of request."""
+    """Return database connection to the pool at end of request."""
     db = g.pop("db", None)
     if db is not None:
+        if db.in_transaction:
+            db.rollback()
+        try:
+            db_pool.put_nowait(db)
+        except queue.Full:
+            db.execute("PRAGMA optimize")
+            db.close()
+
+
+def close_pool():
+    """Close pooled connections, refreshing planner statistics first."""
+    while True:
+        try:
+            db = db_pool.get_nowait()
+        except queue.Empty:
+            return
+        db.execute("PRAGMA optimize")
         db.close()
 
 
 def init_db():
     """Initialize the database schema."""
     with sqlite3.connect(DATABASE) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS analyses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                created_at TEXT NOT NULL,
-                text TEXT NOT NULL,
-                word_count INTEGER NOT NULL,
-                credits REAL NOT NULL,
-                request_json TEXT NOT NULL,
-                response_json TEXT NOT NULL,
-                headline TEXT,
-                prediction_short TEXT,
-                fraction_ai REAL,
-                fraction_ai_assisted REAL,
-                fraction_human REAL
-            )
-        """)
-        conn.commit()
+        init_schema(conn)
+
+        # Gather statistics so the planner picks the indexes
+        conn.execute("ANALYZE")
+
+    while not db_pool.full():
+        db_pool.put_nowait(open_db())
+    atexit.register(close_pool)
+
+
+def cache_get(key: str):
+    """Return a cached JSON response for key, or None if missing or expired."""
+    entry = response_cache.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return app.response_class(entry[1], mimetype="application/json")
+
+
+def cache_put(key: str, version: int, response):
+    """Store the body of a JSON response under key and return the response.
+
+    Nothing is stored if the cache was invalidated since version was read.
+    """
+    with cache_lock:
+        if version == cache_version:
+            response_cache[key] = (time.monotonic() + CACHE_TTL, response.get_data())
+    return response
+
+
+def cache_invalidate():
+    """Drop cached responses and reject any built from earlier reads."""
+    global cache_version
+    with cache_lock:
+        cache_version += 1
+        response_cache.clear()
+
+
+def jsonify(obj):
+    """Build a JSON response, serialized with orjson."""
+    return app.response_class(orjson.dumps(obj), mimetype="application/json")
 
 
 def count_words(text: str) -> int:
     """Count words in text."""
+    if len(text) > LARGE_TEXT_CHARS:
+        # Count matches without holding a list of every word in memory
+        return sum(1 for _ in WORD_RE.finditer(text))
     return len(text.split())
 
 
@@ -92,29 +206,23 @@ def analyze():
 
         # Save to database
         db = get_db()
-        db.execute(
-            """
-            INSERT INTO analyses 
-            (created_at, text, word_count, credits, request_json, response_json,
-             headline, prediction_short, fraction_ai, fraction_ai_assisted, fraction_human)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        analysis_id = db.execute(
+            SQL_INSERT_ANALYSIS,
             (
-                datetime.now().isoformat(),
                 text,
                 word_count,
                 credits,
-                json.dumps(request_data),
-                json.dumps(result),
+                zstd.compress(orjson.dumps(request_data), level=6),
+                zstd.compress(orjson.dumps(result), level=6),
                 result.get("headline"),
                 result.get("prediction_short"),
                 result.get("fraction_ai", 0),
                 result.get("fraction_ai_assisted", 0),
                 result.get("fraction_human", 0),
             ),
-        )
+        ).fetchone()[0]
         db.commit()
-        analysis_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+        cache_invalidate()
 
         return jsonify(
             {
@@ -142,34 +250,47 @@ def analyze():
 @app.route("/history")
 def get_history():
     """Get list of past analyses for sidebar."""
-    db = get_db()
-    rows = db.execute(
-        """
-        SELECT id, created_at, word_count, credits, headline, prediction_short,
-               fraction_ai, fraction_ai_assisted, fraction_human,
-               substr(text, 1, 100) as text_preview
-        FROM analyses
-        ORDER BY created_at DESC
-        LIMIT 100
-    """
-    ).fetchall()
-
-    return jsonify(
-        [
-            {
-                "id": row["id"],
-                "created_at": row["created_at"],
-                "word_count": row["word_count"],
-                "credits": calculate_credits(row["word_count"]),
-                "headline": row["headline"],
-                "prediction_short": row["prediction_short"],
-                "fraction_ai": row["fraction_ai"],
-                "fraction_ai_assisted": row["fraction_ai_assisted"],
-                "fraction_human": row["fraction_human"],
-                "text_preview": row["text_preview"],
-            }
-            for row in rows
-        ]
+    cached = cache_get("history")
+    if cached is not None:
+        return cached
+    version = cache_version
+
+    # Plain tuples are unpacked positionally, skipping per-field Row lookups
+    cursor = get_db().cursor()
+    cursor.row_factory = None
+    cursor.execute(SQL_HISTORY)
+
+    return cache_put(
+        "history",
+        version,
+        jsonify(
+            [
+                {
+                    "id": id_,
+                    "created_at": created_at,
+                    "word_count": word_count,
+                    "credits": credits,
+                    "headline": headline,
+                    "prediction_short": prediction_short,
+                    "fraction_ai": fraction_ai,
+                    "fraction_ai_assisted": fraction_ai_assisted,
+                    "fraction_human": fraction_human,
+                    "text_preview": text_preview,
+                }
+                for (
+                    id_,
+                    created_at,
+                    word_count,
+                    credits,
+                    headline,
+                    prediction_short,
+                    fraction_ai,
+                    fraction_ai_assisted,
+                    fraction_human,
+                    text_preview,
+                ) in cursor
+            ]
+        ),
     )
 
 
@@ -177,64 +298,47 @@ def get_history():
 def get_analysis(analysis_id):
     """Get full analysis by ID."""
     db = get_db()
-    row = db.execute(
-        """
-        SELECT id, created_at, text, word_count, credits, response_json
-        FROM analyses WHERE id = ?
-    """,
-        (analysis_id,),
-    ).fetchone()
+    row = db.execute(SQL_GET_ANALYSIS, (analysis_id,)).fetchone()
 
     if not row:
         return jsonify({"error": "Analysis not found"}), 404
 
-    result = json.loads(row["response_json"])
-
-    return jsonify(
-        {
-            "id": row["id"],
-            "created_at": row["created_at"],
-            "text": row["text"],
-            "word_count": row["word_count"],
-            "credits": row["credits"],
-            "headline": result.get("headline", ""),
-            "prediction": result.get("prediction", ""),
-            "prediction_short": result.get("prediction_short", ""),
-            "fraction_ai": result.get("fraction_ai", 0),
-            "fraction_ai_assisted": result.get("fraction_ai_assisted", 0),
-            "fraction_human": result.get("fraction_human", 0),
-            "num_ai_segments": result.get("num_ai_segments", 0),
-            "num_ai_assisted_segments": result.get("num_ai_assisted_segments", 0),
-            "num_human_segments": result.get("num_human_segments", 0),
-            "windows": result.get("windows", []),
-            "dashboard_link": result.get("dashboard_link"),
-        }
+    # Splice the stored API response in verbatim rather than parsing and
+    # re-serializing it; the client flattens it into the result view
+    body = (
+        b'{"id": %d, "created_at": %s, "text": %s, '
+        b'"word_count": %d, "credits": %d, "response": %s}'
+    ) % (
+        row["id"],
+        orjson.dumps(row["created_at"]),
+        orjson.dumps(row["text"]),
+        row["word_count"],
+        row["credits"],
+        load_json(row["response_json"], row["response_zstd"]),
     )
+    return app.response_class(body, mimetype="application/json")
 
 
 @app.route("/stats")
 def get_stats():
     """Get usage statistics."""
-    db = get_db()
-    row = db.execute(
-        """
-        SELECT 
-            COUNT(*) as total_analyses,
-            COALESCE(SUM(word_count), 0) as total_words
-        FROM analyses
-    """
-    ).fetchone()
-
-    # Calculate credits from word counts
-    rows = db.execute("SELECT word_count FROM analyses").fetchall()
-    total_credits = sum(calculate_credits(r["word_count"]) for r in rows)
-
-    return jsonify(
-        {
-            "total_analyses": row["total_analyses"],
-            "total_words": row["total_words"],
-            "total_credits": total_credits,
-        }
+    cached = cache_get("stats")
+    if cached is not None:
+        return cached
+    version = cache_version
+
+    row = get_db().execute(SQL_STATS).fetchone()
+
+    return cache_put(
+        "stats",
+        version,
+        jsonify(
+            {
+                "total_analyses": row["total_analyses"],
+                "total_words": row["total_words"],
+                "total_credits": row["total_credits"],
+            }
+        ),
     )
 
 
@@ -0,0 +1,91 @@
+"""SQLite setup for the Pangram history database, shared by main.py and cli.py."""
+
+import sqlite3
+from compression import zstd
+
+
+def configure_connection(conn: sqlite3.Connection):
+    """Apply the connection pragmas used by both the web app and the CLI."""
+    # WAL lets reads proceed while /analyze writes; 64 MiB cache and mmap I/O
+    conn.executescript("""
+        PRAGMA busy_timeout = 5000;
+        PRAGMA journal_mode = WAL;
+        PRAGMA synchronous = NORMAL;
+        PRAGMA cache_size = -65536;
+        PRAGMA mmap_size = 268435456;
+        PRAGMA temp_store = MEMORY;
+    """)
+
+
+def load_json(plain: str, compressed: bytes | None) -> bytes:
+    """Return stored request/response JSON, decompressing it if needed."""
+    if compressed is None:
+        return plain.encode()
+    return zstd.decompress(compressed)
+
+
+def init_schema(conn: sqlite3.Connection):
+    """Create the analyses table and its indexes, migrating older databases."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analyses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            text TEXT NOT NULL,
+            word_count INTEGER NOT NULL,
+            credits INTEGER NOT NULL,
+            request_json TEXT NOT NULL,
+            response_json TEXT NOT NULL,
+            request_zstd BLOB,
+            response_zstd BLOB,
+            headline TEXT,
+            prediction_short TEXT,
+            fraction_ai REAL,
+            fraction_ai_assisted REAL,
+            fraction_human REAL
+        )
+    """)
+    # Databases created before request/response JSON was stored compressed
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(analyses)")}
+    for column in ("request_zstd", "response_zstd"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE analyses ADD COLUMN {column} BLOB")
+
+    # Listing/stats columns in created_at order. Listings walk it newest-first
+    # and only visit the table for text previews; stats never leave the index.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analyses_list ON analyses(
+            created_at DESC, word_count, credits, headline, prediction_short,
+            fraction_ai, fraction_ai_assisted, fraction_human
+        )
+    """)
+
+    # Full-text index over analyses.text for substring search. The trigram
+    # tokenizer lets MATCH find arbitrary substrings (3+ characters).
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analyses_fts'"
+    ).fetchone()
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(
+            text, content='analyses', content_rowid='id', tokenize='trigram'
+        )
+    """)
+    conn.executescript("""
+        CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN
+            INSERT INTO analyses_fts(rowid, text) VALUES (new.id, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN
+            INSERT INTO analyses_fts(analyses_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS analyses_au AFTER UPDATE ON analyses BEGIN
+            INSERT INTO analyses_fts(analyses_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO analyses_fts(rowid, text) VALUES (new.id, new.text);
+        END;
+    """)
+    if not has_fts:
+        # One-shot migration: index rows saved before the FTS table existed
+        conn.execute(
+            "INSERT INTO analyses_fts(rowid, text) SELECT id, text FROM analyses"
+        )
+    conn.commit()